@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+# Funções de leitura dos arquivos Excel.
+
+CACHE_COLUMNS = ['Year', 'OCC_CODE', 'OCC_TITLE', 'OCC_GROUP', 'TOT_EMP']
+# Colunas lidas dos arquivos Excel (o nome da coluna de grupo varia entre os anos)
+EXCEL_COLUMNS = {'OCC_CODE', 'OCC_TITLE', 'OCC_GROUP', 'O_GROUP', 'TOT_EMP'}
+# Tipos definidos já na leitura. TOT_EMP fica de fora: tem textos como '#' e '*' misturados aos números
+EXCEL_DTYPES = {'OCC_CODE': 'string', 'OCC_TITLE': 'string', 'OCC_GROUP': 'string', 'O_GROUP': 'string'}
+
+def read_xlsx_slim(path, year):
+    """
+    Lê apenas as colunas necessárias de um arquivo Excel.
+    Usa o leitor calamine (em Rust), bem mais rápido que o openpyxl e sem montar a planilha inteira.
+    """
+    df = pd.read_excel(
+        path,
+        engine='calamine',
+        usecols=lambda col: col in EXCEL_COLUMNS,
+        dtype=EXCEL_DTYPES,
+    )
+
+    # Padronizar a coluna de grupo ocupacional ('O_GROUP' nos anos mais recentes)
+    if 'O_GROUP' in df.columns:
+        df = df.rename(columns={'O_GROUP': 'OCC_GROUP'})
+
+    # Anos cabem em int16
+    df.insert(0, 'Year', np.full(len(df), year, dtype=np.int16))
+    if 'TOT_EMP' in df.columns:
+        # Valores como '#' ou '*' virarão NaN (Nulo); float32 representa exatamente até ~16 milhões
+        df['TOT_EMP'] = pd.to_numeric(df['TOT_EMP'], errors='coerce').astype('float32')
+
+    # Manter apenas as colunas necessárias, na ordem padrão
+    existing_cols = [col for col in CACHE_COLUMNS if col in df.columns]
+    return df[existing_cols]
+
+def read_one(year_and_path):
+    """
+    Lê um único arquivo anual, identificando o arquivo na mensagem de erro se a leitura falhar.
+    """
+    year, filename = year_and_path
+    try:
+        return read_xlsx_slim(filename, year)
+    except Exception as e:
+        raise Exception(f"Erro ao ler {filename}: {e}")
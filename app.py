@@ -1,111 +1,254 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-from scipy.stats import linregress
 import altair as alt
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Verificação de Dependência ---
-# Verifica se o openpyxl está instalado, pois é necessário para pd.read_excel
+# Verifica se o python-calamine está instalado, pois é necessário para ler os arquivos Excel
 try:
-    import openpyxl
+    import python_calamine
 except ImportError:
     st.error(
-        "Erro: A biblioteca 'openpyxl' é necessária para ler os arquivos Excel."
-        "Por favor, rode o comando no seu terminal: pip install openpyxl"
+        "Erro: A biblioteca 'python-calamine' é necessária para ler os arquivos Excel."
+        "Por favor, rode o comando no seu terminal: pip install python-calamine"
     )
     st.stop()
 
+from _ingest import CACHE_COLUMNS, read_one
+
 # --- Carregamento e Processamento de Dados (Otimizado com Cache) ---
 
-@st.cache_data
-def load_and_process_data():
+# Cache persistente em disco (Parquet) com as colunas já filtradas dos arquivos Excel.
+# Diferente do st.cache_data, ele sobrevive a reinícios do processo.
+CACHE_PATH = os.path.join("base_dados", "cache.parquet")
+CACHE_META_PATH = os.path.join("base_dados", "cache.meta.json")
+# Incrementar apenas quando o formato (colunas/tipos) dos dados brutos em cache mudar
+RAW_CACHE_VERSION = 7
+
+# Cache dos resultados já processados (rankings e dados dos gráficos), sempre na mesma pasta
+RESULTS_DIR = os.path.join("base_dados", ".cache_results")
+RESULTS_PATH = os.path.join(RESULTS_DIR, "results.parquet")
+DETAILED_PATH = os.path.join(RESULTS_DIR, "detailed.parquet")
+RESULTS_META_PATH = os.path.join(RESULTS_DIR, "meta.json")
+# Incrementar apenas quando o formato dos resultados processados mudar (não invalida o cache bruto)
+RESULTS_CACHE_VERSION = 7
+
+def _source_signature(filenames):
     """
-    Carrega e processa todos os 10 arquivos anuais da pasta 'base_dados'.
-    Esta função é armazenada em cache pelo Streamlit para alta performance.
+    Gera uma assinatura a partir de (nome, mtime, tamanho) de cada arquivo de origem.
+    Qualquer alteração nos arquivos Excel invalida o cache em disco.
     """
-    
-    folder = "base_dados" # Nome da pasta
-    years = list(range(2015, 2025)) # Anos de 2015 a 2024
-    
-    # Gerar a lista de nomes de arquivos
-    filenames = [os.path.join(folder, f"national_M{year}_dl.xlsx") for year in years]
-    
-    all_dfs = []
-    
-    # --- 1. Carregar e Padronizar ---
-    for year, filename in zip(years, filenames):
+    entries = []
+    for filename in filenames:
         try:
-            # Lê o arquivo Excel
-            df = pd.read_excel(filename) 
-            df['Year'] = year
-            
-            # Padronizar a coluna de grupo ocupacional
-            if 'O_GROUP' in df.columns:
-                df = df.rename(columns={'O_GROUP': 'OCC_GROUP'})
-            
-            # Manter apenas as colunas necessárias
-            cols_to_keep = ['Year', 'OCC_CODE', 'OCC_TITLE', 'OCC_GROUP', 'TOT_EMP']
-            existing_cols = [col for col in cols_to_keep if col in df.columns]
-            df_filtered = df[existing_cols]
-            
-            all_dfs.append(df_filtered)
-            
+            stat = os.stat(filename)
         except FileNotFoundError:
-            # Se um arquivo falhar, avisa o usuário
             raise FileNotFoundError(f"Arquivo não encontrado: {filename}. Verifique a pasta 'base_dados'.")
-        except Exception as e:
-            raise Exception(f"Erro ao ler {filename}: {e}")
+        entries.append(f"{os.path.basename(filename)}:{stat.st_mtime_ns}:{stat.st_size}")
+    return hashlib.blake2b("|".join(entries).encode("utf-8"), digest_size=16).hexdigest()
+
+def _arrow_categories(frame):
+    """
+    Guarda os valores das colunas categóricas como strings Arrow (buffers contíguos),
+    em vez de um objeto Python por valor. Os códigos continuam em NumPy para o kernel.
+    """
+    for col in frame.select_dtypes('category').columns:
+        categories = frame[col].cat.categories
+        frame[col] = frame[col].cat.rename_categories(categories.astype('string[pyarrow]'))
+    return frame
+
+def _read_parquet(path, columns=None):
+    """
+    Lê um arquivo Parquet do cache, restaurando as categorias como strings Arrow.
+    """
+    return _arrow_categories(pd.read_parquet(path, columns=columns))
 
-    if not all_dfs:
-        raise Exception("Nenhum dado foi carregado. A pasta 'base_dados' está vazia ou os arquivos estão nomeados incorretamente.")
+def _read_excel_files(years, filenames):
+    """
+    Lê os arquivos Excel anuais e devolve um único DataFrame com as colunas necessárias.
+    """
+    # --- 1. Carregar e Padronizar ---
+    # Os arquivos são lidos em threads. Processos não servem aqui: o Streamlit substitui o
+    # __main__, e nos modos spawn/forkserver cada processo filho reexecutaria o app.py inteiro
+    with ThreadPoolExecutor(max_workers=min(len(filenames), os.cpu_count() or 1)) as ex:
+        # A existência de cada arquivo já foi verificada em _source_signature
+        all_dfs = list(ex.map(read_one, zip(years, filenames)))
 
     # Combinar todos os dataframes em um só
     full_data = pd.concat(all_dfs, ignore_index=True)
 
+    # Colunas de texto muito repetidas viram 'category' (códigos inteiros + um dicionário de valores)
+    for col in ['OCC_CODE', 'OCC_TITLE', 'OCC_GROUP']:
+        full_data[col] = full_data[col].astype('category')
+    return _arrow_categories(full_data)
+
+def _load_cached(years, filenames, signature):
+    """
+    Devolve os dados brutos filtrados, usando o cache Parquet se os arquivos Excel não mudaram.
+    Caso contrário, lê os arquivos Excel e regrava o cache.
+    """
+    if os.path.exists(CACHE_PATH) and os.path.exists(CACHE_META_PATH):
+        try:
+            with open(CACHE_META_PATH, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("signature") == signature and meta.get("version") == RAW_CACHE_VERSION:
+                return _read_parquet(CACHE_PATH, columns=CACHE_COLUMNS)
+        except Exception:
+            # Cache corrompido ou ilegível: reconstrói a partir dos arquivos Excel
+            pass
+
+    full_data = _read_excel_files(years, filenames)
+
+    try:
+        full_data.to_parquet(CACHE_PATH, compression='zstd', index=False)
+        with open(CACHE_META_PATH, "w", encoding="utf-8") as f:
+            json.dump({
+                "signature": signature,
+                "version": RAW_CACHE_VERSION,
+                "files": [os.path.basename(p) for p in filenames],
+            }, f)
+    except Exception:
+        # Falha ao gravar o cache (ex.: disco somente leitura) não impede o app de rodar
+        pass
+
+    return full_data
+
+def _process_data(full_data):
+    """
+    Filtra as profissões 'detailed', calcula a tendência de cada uma e monta o ranking.
+    """
     # --- 2. Limpeza e Filtragem ---
-    # Converter TOT_EMP para numérico. Erros (como '#' ou '*') virarão NaN (Nulo).
-    full_data['TOT_EMP'] = pd.to_numeric(full_data['TOT_EMP'], errors='coerce')
-    
     # Filtrar apenas por profissões de nível "detailed"
-    detailed_jobs = full_data[full_data['OCC_GROUP'] == 'detailed'].copy()
+    detailed_jobs = full_data[full_data['OCC_GROUP'] == 'detailed'].dropna(subset=['OCC_CODE']).copy()
+    # Descartar as categorias que só existiam nos outros níveis
+    for col in ['OCC_CODE', 'OCC_TITLE']:
+        detailed_jobs[col] = detailed_jobs[col].cat.remove_unused_categories()
     
     if detailed_jobs.empty:
         raise Exception("Nenhum dado 'detailed' encontrado. Verifique os arquivos.")
 
-    # --- 3. Função de Regressão ---
-    def calculate_slope(group):
-        """
-        Calcula a inclinação (slope) da Regressão Linear.
-        """
-        group = group.dropna(subset=['Year', 'TOT_EMP'])
-        if len(group) < 2: # Precisa de pelo menos 2 pontos
-            return np.nan
-        
-        # Converte tipos para garantir compatibilidade com linregress
-        years_int = group['Year'].astype(np.int64)
-        tot_emp_int = group['TOT_EMP'].astype(np.int64)
-        
-        result = linregress(years_int, tot_emp_int)
-        return result.slope
+    # Ordenar uma única vez por profissão e ano (barato com os códigos inteiros das categorias)
+    detailed_jobs = detailed_jobs.sort_values(['OCC_CODE', 'Year'], kind='stable')
+
+    # --- 3. Regressão Linear (forma fechada, vetorizada) ---
+    # slope = Cov(Year, TOT_EMP) / Var(Year), calculado para todas as profissões de uma vez
+    valid = detailed_jobs.dropna(subset=['TOT_EMP'])
+    g = valid.groupby('OCC_CODE', observed=True)
+    # Somas em float64: o float32 da carga perderia precisão nos produtos
+    emp = valid['TOT_EMP'].astype('float64')
+    dx = valid['Year'] - g['Year'].transform('mean')
+    dy = emp - emp.groupby(valid['OCC_CODE'], observed=True).transform('mean')
+    num = (dx * dy).groupby(valid['OCC_CODE'], observed=True).sum()
+    den = (dx ** 2).groupby(valid['OCC_CODE'], observed=True).sum()
 
     # --- 4. Executar Análise ---
-    # Agrupar por profissão e aplicar a função de regressão
-    trends = detailed_jobs.groupby('OCC_CODE').apply(calculate_slope)
-    trends_df = trends.rename('slope').reset_index().dropna()
+    # Precisa de pelo menos 2 pontos (e anos distintos) para haver inclinação
+    trends = (num / den).where((g.size() >= 2) & (den > 0))
 
-    # Buscar o nome mais recente de cada profissão para o relatório
-    job_names = detailed_jobs.groupby('OCC_CODE')['OCC_TITLE'].last().reset_index()
-    final_results = pd.merge(trends_df, job_names, on='OCC_CODE')
+    # O nome mais recente de cada profissão é o da última linha do seu grupo (ordenado por ano).
+    # As duas séries são indexadas por OCC_CODE, então não há merge
+    latest_titles = detailed_jobs.drop_duplicates('OCC_CODE', keep='last').set_index('OCC_CODE')['OCC_TITLE']
+    final_results = latest_titles.to_frame().assign(slope=trends).dropna(subset=['slope'])
+    final_results = final_results.reset_index()[['OCC_CODE', 'slope', 'OCC_TITLE']]
 
     # --- 5. Criar o Ranking ---
-    final_results = final_results.sort_values(by='slope', ascending=False).reset_index(drop=True)
-    final_results['Rank'] = final_results.index + 1
-    final_results['Rank'] = final_results['Rank'].astype(int)
+    # Rank calculado direto da inclinação (1 = maior alta), sem reordenar o DataFrame
+    final_results = final_results.reset_index(drop=True)
+    final_results['Rank'] = final_results['slope'].rank(ascending=False, method='first').astype('int32')
+    # Formatar o número para melhor leitura (uma única vez, e não a cada interação)
+    final_results['slope_formatted'] = final_results['slope'].map(lambda x: f"{x:,.0f}")
+
+    # Dados dos gráficos: sem valores nulos e já ordenados por profissão e ano,
+    # para que a Aba 2 não precise limpar/ordenar a cada interação
+    detailed_jobs = detailed_jobs.dropna(subset=['TOT_EMP']).reset_index(drop=True)
 
     # Retornar os dados completos (para gráficos) e os resultados (para rankings)
     return final_results, detailed_jobs
 
+def _ranking_tables(final_results):
+    """
+    Monta as tabelas de exibição da Aba 1 (Top 10 em alta e Top 10 em baixa).
+    """
+    columns = ['Rank', 'OCC_TITLE', 'slope_formatted']
+    rename = {'OCC_TITLE': 'Profissão'}
+
+    # nlargest/nsmallest fazem uma seleção parcial, sem ordenar o DataFrame inteiro
+    top_10 = final_results.nlargest(10, 'slope')[columns].reset_index(drop=True).rename(columns=rename)
+    bottom_10 = final_results.nsmallest(10, 'slope')[columns].reset_index(drop=True).rename(columns=rename)
+    return top_10, bottom_10
+
+@st.cache_data
+def load_and_process_data():
+    """
+    Carrega e processa todos os 10 arquivos anuais da pasta 'base_dados'.
+    Esta função é armazenada em cache pelo Streamlit para alta performance.
+    Os resultados também ficam salvos em Parquet, então reinícios do app não refazem o processamento.
+    """
+    
+    folder = "base_dados" # Nome da pasta
+    years = list(range(2015, 2025)) # Anos de 2015 a 2024
+    
+    # Gerar a lista de nomes de arquivos
+    filenames = [os.path.join(folder, f"national_M{year}_dl.xlsx") for year in years]
+
+    # Resultados já processados, válidos apenas para esta versão exata dos arquivos Excel
+    signature = _source_signature(filenames)
+
+    final_results = detailed_jobs = None
+    if os.path.exists(RESULTS_META_PATH):
+        try:
+            with open(RESULTS_META_PATH, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("signature") == signature and meta.get("version") == RESULTS_CACHE_VERSION:
+                final_results, detailed_jobs = _read_parquet(RESULTS_PATH), _read_parquet(DETAILED_PATH)
+        except Exception:
+            # Cache corrompido ou ilegível: processa novamente
+            final_results = detailed_jobs = None
+
+    if final_results is None:
+        # Ler do cache Parquet (ou dos arquivos Excel, se algo mudou)
+        full_data = _load_cached(years, filenames, signature)
+        final_results, detailed_jobs = _process_data(full_data)
+
+        try:
+            # Os arquivos são sobrescritos a cada reprocessamento; o meta.json é gravado por último
+            # e removido antes, para que um cache gravado pela metade nunca seja considerado válido
+            os.makedirs(RESULTS_DIR, exist_ok=True)
+            if os.path.exists(RESULTS_META_PATH):
+                os.remove(RESULTS_META_PATH)
+            detailed_jobs.to_parquet(DETAILED_PATH, compression='zstd')
+            final_results.to_parquet(RESULTS_PATH, compression='zstd')
+            with open(RESULTS_META_PATH, "w", encoding="utf-8") as f:
+                json.dump({"signature": signature, "version": RESULTS_CACHE_VERSION}, f)
+        except Exception:
+            # Falha ao gravar o cache não impede o app de rodar
+            pass
+
+    # Tabelas da Aba 1, montadas uma única vez
+    top_10_display, bottom_10_display = _ranking_tables(final_results)
+
+    # Profissões únicas na ordem do ranking, e suas versões em minúsculas para a busca da Aba 2
+    ranked_results = final_results.sort_values('Rank')
+    all_titles_series = pd.Series(ranked_results['OCC_TITLE'].unique().tolist(), dtype=object)
+    all_titles_lower = all_titles_series.str.lower()
+
+    # Consulta direta da Aba 2: título -> (rank, slope, OCC_CODE).
+    # Percorrido do pior para o melhor rank para que, em títulos repetidos, vença o de melhor rank
+    reversed_results = ranked_results.iloc[::-1]
+    title_info = dict(zip(
+        reversed_results['OCC_TITLE'],
+        zip(reversed_results['Rank'], reversed_results['slope'], reversed_results['OCC_CODE']),
+    ))
+
+    # Consulta direta do gráfico: OCC_CODE -> posições de suas linhas em 'detailed_jobs'
+    occ_index = detailed_jobs.groupby('OCC_CODE', observed=True).indices
+
+    return (final_results, detailed_jobs, top_10_display, bottom_10_display,
+            title_info, occ_index, all_titles_series, all_titles_lower)
+
 # --- Interface do Aplicativo ---
 
 st.set_page_config(page_title="Tendências de Emprego", layout="wide")
@@ -115,7 +258,8 @@ st.title("Analisador de Tendências de Emprego (2015-2024)")
 # Tenta carregar os dados e mostra uma barra de progresso
 try:
     with st.spinner("Carregando e processando 10 anos de dados... Isso pode levar um momento."):
-        final_results, detailed_data = load_and_process_data()
+        (final_results, detailed_data, top_10_display, bottom_10_display,
+         title_info, occ_index, all_titles_series, all_titles_lower) = load_and_process_data()
 except Exception as e:
     # Se falhar, mostra o erro e para o app
     st.error(f"Ocorreu um erro crítico ao carregar os dados: {e}")
@@ -135,14 +279,8 @@ with tab1:
     with col1:
         st.subheader("🚀 Top 10 Profissões em Maior Alta")
         
-        # Preparar dados para exibição
-        top_10_display = final_results[['Rank', 'OCC_TITLE', 'slope']].head(10)
-        top_10_display = top_10_display.rename(columns={'OCC_TITLE': 'Profissão', 'slope': 'Crescimento/Ano (Pessoas)'})
-        # Formatar o número para melhor leitura
-        top_10_display['slope_formatted'] = top_10_display['Crescimento/Ano (Pessoas)'].apply(lambda x: f"{x:,.0f}")
-        
         st.dataframe(
-            top_10_display[['Rank', 'Profissão', 'slope_formatted']],
+            top_10_display,
             use_container_width=True,
             hide_index=True
         )
@@ -150,15 +288,8 @@ with tab1:
     with col2:
         st.subheader("📉 Top 10 Profissões em Maior Baixa")
         
-        # Pegar as 10 últimas e reordenar
-        bottom_10 = final_results.tail(10)
-        bottom_10_display = bottom_10[['Rank', 'OCC_TITLE', 'slope']].sort_values(by='slope', ascending=True)
-        bottom_10_display = bottom_10_display.rename(columns={'OCC_TITLE': 'Profissão', 'slope': 'Crescimento/Ano (Pessoas)'})
-        # Formatar o número para melhor leitura
-        bottom_10_display['slope_formatted'] = bottom_10_display['Crescimento/Ano (Pessoas)'].apply(lambda x: f"{x:,.0f}")
-        
         st.dataframe(
-            bottom_10_display[['Rank', 'Profissão', 'slope_formatted']],
+            bottom_10_display,
             use_container_width=True,
             hide_index=True
         )
@@ -167,21 +298,19 @@ with tab1:
 with tab2:
     st.header("Consulta Detalhada por Profissão")
 
-    # Obter lista de todas as profissões únicas
-    all_titles = final_results['OCC_TITLE'].unique()
-
     # --- Caixa de Busca ---
     search_term = st.text_input("Digite um nome de profissão para buscar:")
 
     if search_term:
         # Filtrar títulos que contêm o termo de busca (ignorando maiúsculas/minúsculas)
-        matching_titles = [title for title in all_titles if search_term.lower() in title.lower()]
+        mask = all_titles_lower.str.contains(search_term.lower(), regex=False, na=False)
+        matching_titles = all_titles_series[mask].tolist()
         if not matching_titles:
             st.warning("Nenhuma profissão encontrada com esse termo.")
             st.stop()
     else:
         # Mostrar os primeiros 100 como padrão se nada for digitado
-        matching_titles = all_titles[0:100]
+        matching_titles = all_titles_series[0:100].tolist()
 
     # --- Caixa de Seleção ---
     selected_title = st.selectbox(
@@ -191,9 +320,7 @@ with tab2:
 
     if selected_title:
         # --- 1. Obter Dados do Ranking ---
-        job_rank_data = final_results[final_results['OCC_TITLE'] == selected_title].iloc[0]
-        rank = job_rank_data['Rank']
-        slope = job_rank_data['slope']
+        rank, slope, occ_code = title_info[selected_title]
         total_jobs = len(final_results)
         
         st.divider()
@@ -214,12 +341,9 @@ with tab2:
             )
 
         # --- 2. Preparar Dados do Gráfico ---
-        occ_code = job_rank_data['OCC_CODE']
-        # Buscar os dados da série temporal da profissão selecionada
-        chart_data = detailed_data[detailed_data['OCC_CODE'] == occ_code]
-        
-        # Limpar para o gráfico
-        chart_data = chart_data[['Year', 'TOT_EMP']].dropna().sort_values(by='Year')
+        # Buscar os dados da série temporal da profissão selecionada (acesso direto pelo índice)
+        # Os dados já vêm sem nulos e ordenados por ano desde o carregamento
+        chart_data = detailed_data.iloc[occ_index.get(occ_code, [])][['Year', 'TOT_EMP']]
         
         # --- 3. Criar Gráfico ---
         if chart_data.empty: